@@ -1,29 +1,46 @@
+import os
+
+import matplotlib
+# Plots are saved to files, so use the non-GUI Agg backend rather than
+# spinning up a GUI event loop per figure.
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
+from joblib import Parallel, delayed
+from sklearn.cluster import MiniBatchKMeans
 
 # Use elbow method to determine the optimal number of clusters
 def elbow_method(X, fname, max_k=10):
     """
     Plots the sum of squared errors (SSE) for K-means with k=1..max_k.
     Helps determine an 'elbow' (a point of diminishing returns) for cluster count.
+    X can be dense or a scipy.sparse matrix; MiniBatchKMeans handles both.
+    The fits for different k are independent, so they run in parallel.
     """
-    sse = []
     k_values = range(1, max_k + 1)
-    
-    for k in k_values:
-        kmeans = KMeans(n_clusters=k, random_state=42)
+
+    # Fit one model per k and return its SSE (.inertia_). A single
+    # kmeans++ init per k (instead of the default several) is plenty for
+    # an elbow plot, since we only compare SSE trends across k.
+    def _fit(k):
+        kmeans = MiniBatchKMeans(n_clusters=k, n_init=1, batch_size=1024, random_state=42)
         kmeans.fit(X)
-        sse.append(kmeans.inertia_)  # .inertia_ is the SSE for K-means
-    
-    plt.figure(figsize=(6, 4))
-    plt.plot(k_values, sse, marker='o')
-    plt.xticks(k_values)
-    plt.title("Elbow Method for Optimal k")
-    plt.xlabel("Number of Clusters (k)")
-    plt.ylabel("Sum of Squared Errors (SSE)")
+        return kmeans.inertia_
+
+    # Run the fits across all cores; each k is an independent job
+    sse = Parallel(n_jobs=-1, backend="loky")(delayed(_fit)(k) for k in k_values)
     
+    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.plot(k_values, sse, marker='o')
+    ax.set_xticks(k_values)
+    ax.set_title("Elbow Method for Optimal k")
+    ax.set_xlabel("Number of Clusters (k)")
+    ax.set_ylabel("Sum of Squared Errors (SSE)")
+
     # Save the plot to a file
-    plt.savefig(fname, dpi=300, bbox_inches="tight")
+    fig.savefig(fname, dpi=300, bbox_inches="tight")
     print(f"Plot saved as {fname}")
-    
-    plt.show()
\ No newline at end of file
+
+    # Only pop up the figure when explicitly asked; always free it after.
+    if os.environ.get("SHOW_PLOTS"):
+        plt.show()
+    plt.close(fig)
\ No newline at end of file
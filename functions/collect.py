@@ -1,4 +1,24 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import random
+import re
+import shelve
 import time
+from configparser import ConfigParser
+from datetime import date, timedelta
+
+import httpx
+import urllib3
+
+# Use the C-accelerated stdlib TOML parser (Python >= 3.11); fall back to
+# the API-compatible tomli package on older interpreters.
+try:
+    import tomllib
+except ImportError:
+    import tomli as tomllib
+
 from github import Github, Auth
 from github.GithubException import RateLimitExceededException
 
@@ -17,180 +37,360 @@ def check_remaining_queries(token):
     rate_limit = g.get_rate_limit()
     return rate_limit.core.remaining if rate_limit else 0
 
-def scrape_github(token, max_repos=100, min_stars=100):
+def _window_search(g, start, end, min_stars, max_repos):
     """
-    Scrape GitHub for popular Python repositories (regardless of dependency file)
-    and return the raw repository objects. If rate limited, stop and return
-    whatever has been collected so far.
-    
-    Returns:
-        dict: A dictionary mapping repository full names to their GitHub repository objects.
+    Search one created:{start}..{end} window for popular Python repos.
+    The Search API silently caps any single query at 1000 results, so a
+    window that saturates the cap gets bisected and searched recursively
+    until every leaf window fits underneath it.
     """
-    # Replace with your own GitHub personal access token.
-    auth = Auth.Token(token)
-    g = Github(auth=auth)
-    
-    # Use a single query that gets Python repositories above the min_stars threshold.
-    query = f'language:Python stars:>={min_stars}'
-    
-    raw_repos = {}
-    print("Gathering repository data from GitHub...")
-
+    query = f'language:Python stars:>={min_stars} created:{start.isoformat()}..{end.isoformat()}'
     try:
         repositories = g.search_repositories(query, sort="stars", order="desc")
+        total = repositories.totalCount
     except Exception as e:
-        print("Error querying GitHub:", e)
-        return raw_repos
+        print(f"Error querying window {start}..{end}:", e)
+        return []
 
+    if total >= 1000 and (end - start).days > 1:
+        mid = start + (end - start) / 2
+        return (_window_search(g, start, mid, min_stars, max_repos)
+                + _window_search(g, mid + timedelta(days=1), end, min_stars, max_repos))
+
+    collected = []
     try:
-        # Iterate over the repository objects until we collect up to max_repos.
         for repo in repositories:
-            if len(raw_repos) >= max_repos:
+            collected.append(repo)
+            if len(collected) >= max_repos:
                 break
-            if repo.full_name in raw_repos:
-                continue
-            raw_repos[repo.full_name] = repo
-            print(f"Retrieved: {repo.full_name}")
-            # Sleep a bit to be kind to the API.
-            time.sleep(0.1)
     except RateLimitExceededException:
-        print("Rate limit reached. Returning collected repositories.")
-        return raw_repos
+        print(f"Rate limit reached in window {start}..{end}. Returning partial results.")
     except Exception as e:
         # Optionally, check if the exception is rate-limit related.
         if "rate limit" in str(e).lower():
-            print("Rate limit reached (detected by exception message). Returning collected repositories.")
-            return raw_repos
+            print(f"Rate limit reached in window {start}..{end}. Returning partial results.")
         else:
             print("An unexpected error occurred:", e)
-
-    print(f"Collected {len(raw_repos)} repositories.")
-    return raw_repos
+    return collected
 
 
-def extract_dependencies(raw_repos):
+def scrape_github(token, max_repos=100, min_stars=100):
     """
-    Given a dictionary of raw GitHub repository objects, extract and deduplicate
-    dependencies from each repo by looking for common dependency files.
-    
-    This version parallelizes the process using ThreadPoolExecutor.
-    
+    Scrape GitHub for popular Python repositories (regardless of dependency file)
+    and return the raw repository objects. If rate limited, stop and return
+    whatever has been collected so far.
+
+    A single sorted cursor is capped at 1000 results by the Search API, so
+    the search is split into creation-date windows which are fetched
+    concurrently (and bisected further whenever one saturates the cap).
+
     Returns:
-        dict: A dictionary mapping repository full names to a list of normalized dependencies.
+        dict: A dictionary mapping repository full names to their GitHub repository objects.
     """
-    import re, ast, time
-    from configparser import ConfigParser
-    import toml
-    import concurrent.futures
+    # Replace with your own GitHub personal access token.
+    # per_page=100 fetches the maximum repos per search page (vs the
+    # default 30), and the urllib3 Retry policy backs off on rate-limit
+    # and transient server errors at the transport layer.
+    auth = Auth.Token(token)
+    g = Github(
+        auth=auth,
+        per_page=100,
+        retry=urllib3.util.Retry(total=5, backoff_factor=2,
+                                 status_forcelist=[403, 429, 500, 502, 503, 504]),
+    )
 
-    # Define helper functions for each file type.
-    def extract_packages_from_requirements(text):
+    raw_repos = {}
+    print("Gathering repository data from GitHub...")
+
+    # Start from coarse yearly windows (GitHub launched in 2008) and let
+    # _window_search bisect any window that hits the 1000-result cap.
+    today = date.today()
+    windows = [(date(year, 1, 1), min(date(year, 12, 31), today))
+               for year in range(2008, today.year + 1)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(_window_search, g, window_start, window_end, min_stars, max_repos)
+                   for window_start, window_end in windows]
+        for future in concurrent.futures.as_completed(futures):
+            for repo in future.result():
+                if len(raw_repos) >= max_repos:
+                    break
+                # Search results already carry full_name; read it from the
+                # raw payload so the lazy attribute can't trigger an extra
+                # API round-trip per repo.
+                full_name = repo._rawData["full_name"]
+                if full_name in raw_repos:
+                    continue
+                raw_repos[full_name] = repo
+                print(f"Retrieved: {full_name}")
+
+    print(f"Collected {len(raw_repos)} repositories.")
+    return raw_repos
+
+
+# Patterns used by the parsers below, compiled once at import time so the
+# per-line loops don't pay re's cache lookup on every call.
+_VERSPEC_RE = re.compile(r'[<=>]')
+_COMMENT_RE = re.compile(r'\s+#')
+_INSTALL_REQ_RE = re.compile(r'install_requires\s*=\s*(\[[^\]]*\])', re.MULTILINE | re.DOTALL)
+_STR_LITERAL_RE = re.compile(r"['\"]([A-Za-z0-9_.\-\[\]]+[^'\"]*?)['\"]")
+
+# Helper functions for each dependency file type.
+def extract_packages_from_requirements(text):
+    packages = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or line.startswith("-"):
+            continue
+        line = _COMMENT_RE.split(line)[0]
+        pkg = _VERSPEC_RE.split(line)[0].strip()
+        if pkg:
+            packages.append(pkg.lower())
+    return packages
+
+def extract_packages_from_setup_py(text):
+    match = _INSTALL_REQ_RE.search(text)
+    if match:
+        list_str = match.group(1)
+        # Pull the string literals out of the list directly; unlike
+        # ast.literal_eval this tolerates f-strings, concatenation, and
+        # comments inside the install_requires list.
         packages = []
-        for line in text.splitlines():
-            line = line.strip()
-            if not line or line.startswith("#") or line.startswith("-"):
-                continue
-            line = re.split(r'\s+#', line)[0]
-            pkg = re.split(r'[<=>]', line)[0].strip()
-            if pkg:
-                packages.append(pkg.lower())
+        for dep in _STR_LITERAL_RE.findall(list_str):
+            dep_clean = _VERSPEC_RE.split(dep)[0].strip().lower()
+            if dep_clean:
+                packages.append(dep_clean)
         return packages
+    return []
 
-    def extract_packages_from_setup_py(text):
-        pattern = re.compile(r'install_requires\s*=\s*(\[[^\]]*\])', re.MULTILINE | re.DOTALL)
-        match = pattern.search(text)
-        if match:
-            list_str = match.group(1)
-            try:
-                deps = ast.literal_eval(list_str)
-                packages = []
-                for dep in deps:
-                    dep_clean = re.split(r'[<=>]', dep)[0].strip().lower()
-                    if dep_clean:
-                        packages.append(dep_clean)
-                return packages
-            except Exception:
-                return []
-        return []
+def extract_packages_from_setup_cfg(text):
+    config = ConfigParser()
+    config.read_string(text)
+    if config.has_option('options', 'install_requires'):
+        deps_str = config.get('options', 'install_requires')
+        packages = []
+        for line in deps_str.splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                pkg = _VERSPEC_RE.split(line)[0].strip()
+                if pkg:
+                    packages.append(pkg.lower())
+        return packages
+    return []
 
-    def extract_packages_from_setup_cfg(text):
-        config = ConfigParser()
-        config.read_string(text)
-        if config.has_option('options', 'install_requires'):
-            deps_str = config.get('options', 'install_requires')
+def extract_packages_from_pyproject(text):
+    try:
+        data = tomllib.loads(text)
+        if 'project' in data and 'dependencies' in data['project']:
+            deps = data['project']['dependencies']
             packages = []
-            for line in deps_str.splitlines():
-                line = line.strip()
-                if line and not line.startswith("#"):
-                    pkg = re.split(r'[<=>]', line)[0].strip()
-                    if pkg:
-                        packages.append(pkg.lower())
+            for dep in deps:
+                pkg = _VERSPEC_RE.split(dep)[0].strip()
+                if pkg:
+                    packages.append(pkg.lower())
             return packages
+        elif 'tool' in data and 'poetry' in data['tool']:
+            poetry_deps = data['tool']['poetry'].get('dependencies', {})
+            packages = [pkg.lower() for pkg in poetry_deps if pkg.lower() != 'python']
+            return packages
+    except Exception:
         return []
+    return []
 
-    def extract_packages_from_pyproject(text):
-        try:
-            data = toml.loads(text)
-            if 'project' in data and 'dependencies' in data['project']:
-                deps = data['project']['dependencies']
-                packages = []
-                for dep in deps:
-                    pkg = re.split(r'[<=>]', dep)[0].strip()
-                    if pkg:
-                        packages.append(pkg.lower())
-                return packages
-            elif 'tool' in data and 'poetry' in data['tool']:
-                poetry_deps = data['tool']['poetry'].get('dependencies', {})
-                packages = [pkg.lower() for pkg in poetry_deps if pkg.lower() != 'python']
-                return packages
-        except Exception:
-            return []
-        return []
-    
-    def extract_from_file(file_name, file_text):
-        if file_name.endswith("requirements.txt"):
-            return extract_packages_from_requirements(file_text)
-        elif file_name == "setup.py":
-            return extract_packages_from_setup_py(file_text)
-        elif file_name == "setup.cfg":
-            return extract_packages_from_setup_cfg(file_text)
-        elif file_name.endswith("pyproject.toml"):
-            return extract_packages_from_pyproject(file_text)
-        else:
-            return extract_packages_from_requirements(file_text)
-    
-    dependency_files = ["requirements.txt", "setup.py", "setup.cfg", "pyproject.toml"]
-    repos_dependencies = {}
+# Many popular repos share identical dependency files (forks, templates,
+# mirrors), so cache parse results keyed on a digest of the file text.
+# The digest keeps cache keys small even when the files themselves are large.
+_parse_cache = {}
+_PARSE_CACHE_MAX = 8192
 
-    # Define a function to process a single repository.
-    def process_repo(repo):
-        aggregated_packages = []
-        for file_name in dependency_files:
+def _parse_cached(parser, text):
+    key = (parser.__name__, hashlib.blake2b(text.encode(), digest_size=16).hexdigest())
+    result = _parse_cache.get(key)
+    if result is None:
+        result = tuple(parser(text))
+        if len(_parse_cache) >= _PARSE_CACHE_MAX:
+            _parse_cache.clear()
+        _parse_cache[key] = result
+    return result
+
+def extract_from_file(file_name, file_text):
+    if file_name.endswith("requirements.txt"):
+        parser = extract_packages_from_requirements
+    elif file_name == "setup.py":
+        parser = extract_packages_from_setup_py
+    elif file_name == "setup.cfg":
+        parser = extract_packages_from_setup_cfg
+    elif file_name.endswith("pyproject.toml"):
+        parser = extract_packages_from_pyproject
+    else:
+        parser = extract_packages_from_requirements
+    return list(_parse_cached(parser, file_text))
+
+
+# GitHub v4 (GraphQL) endpoint used to batch-fetch dependency file contents.
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+
+async def _post_with_backoff(client, payload, max_attempts=5):
+    """
+    POST with rate-limit-aware pacing. After a successful call, spread the
+    remaining quota over the time left in the window (from the
+    X-RateLimit-Remaining/-Reset headers) instead of sleeping a flat
+    amount. On 403/429, sleep until the advertised reset time, or back
+    off exponentially (with jitter, capped at 60s) if no reset is given.
+    """
+    response = None
+    for attempt in range(max_attempts):
+        response = await client.post(GITHUB_GRAPHQL_URL, json=payload)
+        if response.status_code not in (403, 429):
+            remaining = int(response.headers.get("X-RateLimit-Remaining") or 1)
+            reset = int(response.headers.get("X-RateLimit-Reset") or 0)
+            wait = (reset - time.time()) / max(1, remaining)
+            if wait > 0:
+                await asyncio.sleep(min(wait, 60))
+            return response
+        reset = int(response.headers.get("X-RateLimit-Reset") or 0)
+        wait = reset - time.time()
+        if wait <= 0:
+            wait = min(2 ** attempt, 60)
+        print(f"Rate limited (HTTP {response.status_code}); retrying in {wait:.0f}s...")
+        await asyncio.sleep(wait + random.random())
+    return response
+
+
+async def _fetch_blob_batches(batches, headers, max_concurrency=50):
+    """
+    POST the GraphQL blob queries for all batches concurrently over one
+    HTTP/2 client, with a semaphore bounding in-flight requests. Returns
+    one decoded data dict per batch (None for batches that failed),
+    in the same order as the input.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(client, batch):
+        payload = {"query": _build_blob_query(batch)}
+        async with semaphore:
             try:
-                content_file = repo.get_contents(file_name)
-                file_text = content_file.decoded_content.decode("utf-8", errors="replace")
-                packages = extract_from_file(file_name, file_text)
-                aggregated_packages.extend(packages)
-            except Exception:
+                response = await _post_with_backoff(client, payload)
+                response.raise_for_status()
+                return response.json().get("data") or {}
+            except Exception as e:
+                print(f"GraphQL batch starting at {batch[0]} failed: {e}")
+                return None
+
+    async with httpx.AsyncClient(http2=True, headers=headers, timeout=30.0) as client:
+        return await asyncio.gather(*[fetch(client, batch) for batch in batches])
+
+# GraphQL aliases must be plain identifiers, so map each alias to the
+# dependency file it fetches.
+DEPENDENCY_FILE_ALIASES = {
+    "requirements": "requirements.txt",
+    "setup_py": "setup.py",
+    "setup_cfg": "setup.cfg",
+    "pyproject": "pyproject.toml",
+}
+
+# On-disk cache of fetched dependency-file contents, so re-runs skip the
+# network entirely for repos that haven't been pushed to since last time.
+GH_CACHE_PATH = "data/ghcache"
+
+def _cache_key(full_name, repo):
+    """
+    Cache key for a repo's dependency files. Including the push timestamp
+    invalidates the cached blobs whenever the repo gets new commits.
+    """
+    pushed = getattr(repo, "pushed_at", None)
+    return f"{full_name}@{pushed.isoformat() if pushed else 'unknown'}"
+
+def _build_blob_query(full_names):
+    """
+    Build one GraphQL query that fetches all four candidate dependency files
+    for every repository in full_names, using aliased sub-selections.
+    """
+    blob_fields = " ".join(
+        f'{alias}: object(expression: "HEAD:{file_name}") {{ ... on Blob {{ text }} }}'
+        for alias, file_name in DEPENDENCY_FILE_ALIASES.items()
+    )
+    selections = []
+    for idx, full_name in enumerate(full_names):
+        owner, name = full_name.split("/", 1)
+        selections.append(
+            f'r{idx}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) '
+            f'{{ {blob_fields} }}'
+        )
+    return "query { " + " ".join(selections) + " }"
+
+
+def extract_dependencies(raw_repos, token, batch_size=20):
+    """
+    Given a dictionary of raw GitHub repository objects, extract and deduplicate
+    dependencies from each repo by looking for common dependency files.
+
+    Instead of one REST get_contents call per candidate file (mostly 404s),
+    this batches repositories into GraphQL queries that return all four
+    dependency file blobs for many repos in a single POST.
+
+    Fetched blobs are cached on disk keyed by repo name and push timestamp,
+    so unchanged repos are served from the cache on re-runs (missing files
+    are cached as None so we don't re-query them either).
+
+    Returns:
+        dict: A dictionary mapping repository full names to a list of normalized dependencies.
+    """
+    repos_dependencies = {}
+    headers = {"Authorization": f"bearer {token}"}
+
+    print("Extracting dependencies from repositories (batched GraphQL)...")
+    blobs_by_repo = {}
+    with shelve.open(GH_CACHE_PATH) as cache:
+        # Serve repos with cached blobs from disk; fetch the rest.
+        to_fetch = []
+        for full_name, repo in raw_repos.items():
+            key = _cache_key(full_name, repo)
+            if key in cache:
+                blobs_by_repo[full_name] = cache[key]
+            else:
+                to_fetch.append(full_name)
+        if blobs_by_repo:
+            print(f"Loaded cached dependency files for {len(blobs_by_repo)} repositories.")
+
+        # Fetch all batches concurrently; each GraphQL POST does ~1 KB of
+        # work, so async IO beats burning an OS thread per request.
+        batches = [to_fetch[start:start + batch_size]
+                   for start in range(0, len(to_fetch), batch_size)]
+        results = asyncio.run(_fetch_blob_batches(batches, headers)) if batches else []
+        for batch, data in zip(batches, results):
+            if data is None:
                 continue
-        aggregated_packages = list(set(aggregated_packages))
+            for idx, full_name in enumerate(batch):
+                repo_data = data.get(f"r{idx}") or {}
+                # None marks a file the repo doesn't have.
+                blobs = {
+                    file_name: (repo_data.get(alias) or {}).get("text")
+                    for alias, file_name in DEPENDENCY_FILE_ALIASES.items()
+                }
+                blobs_by_repo[full_name] = blobs
+                cache[_cache_key(full_name, raw_repos[full_name])] = blobs
+
+    # Parse the collected blobs (cached and freshly fetched alike).
+    for full_name, blobs in blobs_by_repo.items():
+        # Repos with none of the dependency files come back as all-None
+        # blobs; skip them before doing any parsing work.
+        if not any(blobs.values()):
+            continue
+        aggregated_packages = []
+        for file_name, file_text in blobs.items():
+            if file_text:
+                # A malformed file (e.g. a setup.cfg that ConfigParser
+                # rejects) shouldn't take down the whole extraction.
+                try:
+                    aggregated_packages.extend(extract_from_file(file_name, file_text))
+                except Exception:
+                    continue
+        # Dedupe across files in one pass, keeping first-seen order.
+        aggregated_packages = list(dict.fromkeys(aggregated_packages))
         if aggregated_packages:
-            # Optionally, sleep a bit to ease rate limits.
-            time.sleep(0.1)
-            return repo.full_name, aggregated_packages
-        return None
-
-    print("Extracting dependencies from repositories (parallelized)...")
-    # Parallelize processing using ThreadPoolExecutor
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        # Submit a task for each repository
-        future_to_repo = {executor.submit(process_repo, repo): repo for repo in raw_repos.values()}
-        for future in concurrent.futures.as_completed(future_to_repo):
-            result = future.result()
-            if result:
-                repo_name, aggregated_packages = result
-                repos_dependencies[repo_name] = aggregated_packages
-                print(f"Processed: {repo_name} with {len(aggregated_packages)} package(s)")
+            repos_dependencies[full_name] = aggregated_packages
+            print(f"Processed: {full_name} with {len(aggregated_packages)} package(s)")
 
     print(f"Extracted dependencies from {len(repos_dependencies)} repositories.")
     return repos_dependencies
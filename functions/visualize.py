@@ -1,3 +1,9 @@
+import os
+
+import matplotlib
+# Plots are saved to files, so use the non-GUI Agg backend rather than
+# spinning up a GUI event loop per figure.
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.spatial import ConvexHull
@@ -11,14 +17,14 @@ def cluster_plot(optimal_k, clusters, X_pca, fname):
     # Seaborn's color palette is handy for this.
     palette = sns.color_palette("bright", n_colors=optimal_k)
 
-    plt.figure(figsize=(8, 6))
+    fig, ax = plt.subplots(figsize=(8, 6))
 
     for cluster_id in range(optimal_k):
         # Extract the points in this cluster
         cluster_points = X_pca[clusters == cluster_id]
-        
+
         # Plot the individual data points
-        plt.scatter(
+        ax.scatter(
             cluster_points[:, 0],
             cluster_points[:, 1],
             s=40,
@@ -26,29 +32,40 @@ def cluster_plot(optimal_k, clusters, X_pca, fname):
             label=f"Cluster {cluster_id + 1}",
             alpha=0.7
         )
-        
-        # Compute and draw the convex hull, if there are enough points
+
+        # Compute and draw the convex hull, if there are enough points.
+        # ConvexHull is O(n log n), so for big clusters compute it on a
+        # random sample; at scatter-plot resolution the hull of 5000
+        # points is visually identical to the full one.
         if len(cluster_points) > 2:
-            hull = ConvexHull(cluster_points)
+            if len(cluster_points) > 5000:
+                sample_idx = np.random.default_rng(0).choice(len(cluster_points), 5000, replace=False)
+                pts = cluster_points[sample_idx]
+            else:
+                pts = cluster_points
+            hull = ConvexHull(pts)
             # Create a polygon by connecting the hull vertices
-            hull_vertices = np.append(hull.vertices, hull.vertices[0])  # close the polygon
-            plt.fill(
-                cluster_points[hull_vertices, 0],
-                cluster_points[hull_vertices, 1],
+            hull_vertices = np.r_[hull.vertices, hull.vertices[0]]  # close the polygon
+            ax.fill(
+                pts[hull_vertices, 0],
+                pts[hull_vertices, 1],
                 color=palette[cluster_id],
                 alpha=0.2
             )
 
-    plt.title("K-means Clusters with Convex Hull Boundaries (PCA 2D)")
-    plt.xlabel("PC1")
-    plt.ylabel("PC2")
-    plt.legend()
+    ax.set_title("K-means Clusters with Convex Hull Boundaries (PCA 2D)")
+    ax.set_xlabel("PC1")
+    ax.set_ylabel("PC2")
+    ax.legend()
 
     # Save the plot to a file
-    plt.savefig(fname, dpi=300, bbox_inches="tight")
+    fig.savefig(fname, dpi=300, bbox_inches="tight")
     print(f"Plot saved as {fname}")
 
-    plt.show()
+    # Only pop up the figure when explicitly asked; always free it after.
+    if os.environ.get("SHOW_PLOTS"):
+        plt.show()
+    plt.close(fig)
 
 def cluster_bar_charts(cluster_top_packages, optimal_k, fname):
     """
@@ -73,19 +90,20 @@ def cluster_bar_charts(cluster_top_packages, optimal_k, fname):
         # Unpack the package names and frequencies
         packages, frequencies = zip(*top10)
         
-        plt.figure(figsize=(8,6))
+        fig, ax = plt.subplots(figsize=(8,6))
         # Use the color corresponding to this cluster
-        plt.bar(packages, frequencies, color=palette[cluster])
-        plt.title(f"Top 10 Packages in Cluster {cluster + 1}")
-        plt.xlabel("Packages")
-        plt.ylabel("Frequency")
-        plt.xticks(rotation=45, ha="right")
-        plt.tight_layout()
-        
+        ax.bar(packages, frequencies, color=palette[cluster])
+        ax.set_title(f"Top 10 Packages in Cluster {cluster + 1}")
+        ax.set_xlabel("Packages")
+        ax.set_ylabel("Frequency")
+        plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
+        fig.tight_layout()
+
         # Build a unique filename for this cluster and save the plot
         filename = f"{fname}_cluster{cluster + 1}.png"
-        plt.savefig(filename, dpi=300, bbox_inches="tight")
+        fig.savefig(filename, dpi=300, bbox_inches="tight")
         print(f"Saved bar chart for Cluster {cluster + 1} as {filename}")
-        
-        plt.show()
-        plt.close()  # Good practice to close the figure after saving/showing.
+
+        if os.environ.get("SHOW_PLOTS"):
+            plt.show()
+        plt.close(fig)  # Good practice to close the figure after saving/showing.
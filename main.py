@@ -1,11 +1,14 @@
 # Libraries
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
+from scipy.sparse import csr_matrix
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
 import matplotlib.pyplot as plt
-from collections import Counter
+from collections import Counter, defaultdict
+import hashlib
 import os
 import pickle
+import zstandard as zstd
 
 # Import my functions
 from functions.collect import scrape_github, check_remaining_queries, extract_dependencies
@@ -15,6 +18,29 @@ from functions.visualize import cluster_plot, cluster_bar_charts
 # Note that I saved my GitHub API token to an environment variable
 token = os.environ.get("GITHUB_TOKEN")
 
+# Small helpers for fast persistence: pickle protocol 5 wrapped in zstd
+def save_zstd_pickle(obj, path):
+    # Skip the write (and the compression) when the contents haven't
+    # changed since the last run, tracked via a digest sidecar file.
+    buf = pickle.dumps(obj, protocol=5)
+    digest = hashlib.blake2b(buf, digest_size=16).digest()
+    sidecar = path + ".hash"
+    # Only skip when the data file itself is still there; a matching
+    # sidecar alone must not suppress regenerating a deleted pickle.
+    if os.path.exists(path) and os.path.exists(sidecar):
+        with open(sidecar, "rb") as infile:
+            if infile.read() == digest:
+                return
+    cctx = zstd.ZstdCompressor(level=3)
+    with open(path, "wb") as outfile:
+        outfile.write(cctx.compress(buf))
+    with open(sidecar, "wb") as outfile:
+        outfile.write(digest)
+
+def load_zstd_pickle(path):
+    with open(path, "rb") as infile:
+        return pickle.loads(zstd.ZstdDecompressor().decompress(infile.read()))
+
 # See how many queries I have left in my GitHub API rate limit window
 check_remaining_queries(token)
 
@@ -22,22 +48,25 @@ check_remaining_queries(token)
 raw = scrape_github(token = token, max_repos=4000, min_stars=100)
 
 # Extract and deduplicate dependencies from the scraped repositories
-repos = extract_dependencies(raw)
+repos = extract_dependencies(raw, token=token)
 
 # Check results
 for repo_name, deps in repos.items():
     print(f"{repo_name}: {deps}")
 
-# Save objects to disk using pickle
-with open("data/raw.pkl", "wb") as outfile:
-    pickle.dump(raw, outfile)
-
-with open("data/repos.pkl", "wb") as outfile:
-    pickle.dump(repos, outfile)
+# Save objects to disk as zstd-compressed protocol-5 pickles. The raw
+# PyGithub repository objects drag live connection state through pickle,
+# so snapshot just their metadata dicts instead. Read _rawData rather
+# than the raw_data property: the latter lazily "completes" each search
+# result with an extra REST call, while the search payload already holds
+# all the metadata worth keeping.
+raw_metadata = {full_name: repo._rawData for full_name, repo in raw.items()}
+save_zstd_pickle(raw_metadata, "data/raw.pkl.zst")
+save_zstd_pickle(repos, "data/repos.pkl.zst")
 
 # You can avoid re-running the scrape and extract functions by loading the pickled objects
-with open("data/repos.pkl", "rb") as infile:
-    repos = pickle.load(infile)
+if os.path.exists("data/repos.pkl.zst"):
+    repos = load_zstd_pickle("data/repos.pkl.zst")
 
 
 # Build a set of all unique packages across repositories
@@ -50,17 +79,27 @@ num_packages = len(all_packages)
 # Echo some details about the scraped data
 print("Scraped",num_repos, "repositories and found",num_packages,"unique packages.")
 
-# Create a repository-by-package binary matrix
-X = np.zeros((num_repos, num_packages), dtype=int)
-
 # Create a mapping from package names to indices
 package_to_index = {pkg: idx for idx, pkg in enumerate(all_packages)}
 
-for i, repo in enumerate(repo_names):
-    for pkg in repos[repo]:
-        j = package_to_index.get(pkg)
-        if j is not None:
-            X[i, j] = 1
+# Create a repository-by-package binary matrix.
+# Each row only has a handful of ones, so build a sparse CSR matrix from
+# (row, col) index arrays. np.fromiter fills the arrays in one pass
+# instead of growing Python lists with per-element appends.
+rows = np.fromiter(
+    (i for i, repo in enumerate(repo_names)
+     for pkg in repos[repo] if pkg in package_to_index),
+    dtype=np.int32,
+)
+cols = np.fromiter(
+    (package_to_index[pkg] for repo in repo_names
+     for pkg in repos[repo] if pkg in package_to_index),
+    dtype=np.int32,
+)
+X = csr_matrix(
+    (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+    shape=(num_repos, num_packages)
+)
 
 # Use elbow method to determine the optimal number of clusters
 elbow_method(X, fname="outputs/elbow.png")
@@ -68,33 +107,34 @@ elbow_method(X, fname="outputs/elbow.png")
 # Set the optimal number of clusters based on the elbow method
 optimal_k = 5
 
-# Run kmeans
-kmeans = KMeans(n_clusters=optimal_k, random_state=8675309)
+# The matrix values are all {0, 1}, so float32 is plenty of precision;
+# keep it that way so KMeans distance computations read 4 bytes per
+# nonzero instead of 8 (no copy is made when the dtype already matches).
+X = X.astype(np.float32, copy=False)
+
+# Run kmeans (MiniBatchKMeans works directly on the sparse matrix)
+kmeans = MiniBatchKMeans(n_clusters=optimal_k, batch_size=1024, random_state=8675309)
 clusters = kmeans.fit_predict(X)
 
-# Run PCA to reduce to 2D for visualization
-pca = PCA(n_components=2)
-X_pca = pca.fit_transform(X)
+# Run truncated SVD (sparse-friendly PCA) to reduce to 2D for visualization.
+# The randomized range finder only does the work for the 2 components we
+# keep, instead of the full-rank decomposition PCA would run.
+svd = TruncatedSVD(n_components=2, algorithm="randomized", n_iter=4, random_state=42)
+X_pca = svd.fit_transform(X)
 plt.scatter(X_pca[:, 1], X_pca[:, 0], c=clusters, cmap='viridis', alpha=0.7)
 
 # List top 10 packages based on frequency
 
-# Group the repository names by their cluster labels:
-cluster_repo_map = {}
+# Count package frequencies per cluster in a single sweep over the repos,
+# feeding each repo's dependencies straight into its cluster's Counter
+# instead of building intermediate per-cluster package lists.
+cluster_counters = defaultdict(Counter)
 for repo, label in zip(repo_names, clusters):
-    cluster_repo_map.setdefault(label, []).append(repo)
-
-# Create a dictionary to store the top 10 packages for each cluster:
-cluster_top_packages = {}
-for label, repo_list in cluster_repo_map.items():
-    # Collect all packages for repositories in this cluster:
-    cluster_packages = []
-    for repo in repo_list:
-        # Look up dependencies for this repo in the 'repos' dictionary.
-        cluster_packages.extend(repos[repo])
-    counter = Counter(cluster_packages) # Count frequency of each package
-    top_10 = counter.most_common(10)
-    cluster_top_packages[label] = top_10 # Save result to dictionary
+    cluster_counters[label].update(repos[repo])
+
+# Keep the top 10 packages for each cluster:
+cluster_top_packages = {label: counter.most_common(10)
+                        for label, counter in cluster_counters.items()}
 
 # Plot the top packages in each cluster
 cluster_plot(optimal_k, clusters, X_pca, fname="outputs/cluster_plot.png")